@@ -5,7 +5,11 @@ import pytest
 from PIL import Image
 from tensorflow.keras.applications.mobilenet_v2 import MobileNetV2, preprocess_input
 
-from visualime.explain import explain_classification, render_explanation
+from visualime.explain import (
+    explain_classification,
+    explain_classifications,
+    render_explanation,
+)
 
 model = MobileNetV2()
 
@@ -61,6 +65,45 @@ def test_end_to_end(segment_selection_method):
         num_of_segments=2,
     )
 
+    rendered = render_explanation(
+        image,
+        segment_mask,
+        segment_weights,
+        positive="green",
+        coverage=0.2,
+        return_array=True,
+    )
+
+    assert rendered.shape == (224, 224, 3)
+    assert rendered.dtype == np.uint8
+
+
+def test_that_multiple_images_are_explained_at_once():
+    explanations = explain_classifications(
+        images=[image, image[::-1, :, :]],
+        predict_fn=predict_fn,
+        num_of_samples=32,
+        max_workers=2,
+    )
+
+    assert len(explanations) == 2
+    for segment_mask, segment_weights in explanations:
+        assert segment_mask.shape == (224, 224)
+        assert segment_weights.shape == (np.max(segment_mask) + 1,)
+
+
+def test_that_no_images_give_no_explanations():
+    assert explain_classifications(images=[], predict_fn=predict_fn) == []
+
+
+def test_that_one_label_index_per_image_is_required():
+    with pytest.raises(ValueError):
+        _ = explain_classifications(
+            images=[image, image[::-1, :, :]],
+            predict_fn=predict_fn,
+            label_idx=[0],
+        )
+
 
 def test_that_unknown_selection_method_raises_exception():
     with pytest.raises(ValueError):
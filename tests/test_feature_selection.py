@@ -6,6 +6,7 @@ from visualime.feature_selection import (
     lars_selection,
     select_by_weight,
 )
+from visualime.lime import generate_samples
 
 NUM_SAMPLES = 1024
 NUM_SEGMENTS = 10
@@ -114,3 +115,29 @@ def test_that_forward_selection_only_accepts_known_models():
             model_type="this-model-does-not-exist-and-never-will",
             num_segments_to_select=3,
         )
+
+
+@pytest.mark.parametrize(
+    "function", [select_by_weight, forward_selection, lars_selection]
+)
+def test_that_generated_samples_can_be_used_for_selection(function):
+    segment_mask = np.arange(NUM_SEGMENTS).repeat(10).reshape((10, NUM_SEGMENTS))
+    coefs = np.linspace(0.0, 1.0, NUM_SEGMENTS)
+    generated_samples = generate_samples(segment_mask, NUM_SAMPLES, p=0.5, seed=0)
+    generated_predictions = (generated_samples @ coefs).reshape((NUM_SAMPLES, 1))
+
+    segment_subset = function(
+        samples=generated_samples,
+        predictions=generated_predictions,
+        label_idx=LABEL_IDX,
+        num_segments_to_select=3,
+    )
+    float_segment_subset = function(
+        samples=generated_samples.astype(float),
+        predictions=generated_predictions,
+        label_idx=LABEL_IDX,
+        num_segments_to_select=3,
+    )
+
+    assert len(segment_subset) == 3
+    assert set(segment_subset) == set(float_segment_subset)
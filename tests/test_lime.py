@@ -5,10 +5,15 @@ import pytest
 
 from visualime.lime import (
     SEGMENTATION_METHODS,
+    SegmentIndex,
+    _fast_slic,
+    _generate_image_batches,
+    clear_segmentation_cache,
     compute_distances,
     create_segments,
     generate_images,
     generate_samples,
+    predict_images,
     weigh_segments,
 )
 
@@ -23,6 +28,37 @@ segment_mask = np.random.randint(
 samples = generate_samples(segment_mask, 100, p=0.5)
 
 
+def test_that_samples_are_binary_uint8():
+    assert samples.dtype == np.uint8
+    assert samples.shape == (100, MAX_SEGMENT_INDEX + 1)
+    assert set(np.unique(samples)) <= {0, 1}
+
+
+def test_that_samples_are_reproducible_with_seed():
+    assert np.array_equal(
+        generate_samples(segment_mask, 100, p=0.5, seed=42),
+        generate_samples(segment_mask, 100, p=0.5, seed=42),
+    )
+    assert not np.array_equal(
+        generate_samples(segment_mask, 100, p=0.5, seed=42),
+        generate_samples(segment_mask, 100, p=0.5, seed=43),
+    )
+
+
+@pytest.mark.parametrize("p", [0.0, 0.33, 1.0])
+def test_that_segments_are_sampled_with_probability_p(p):
+    large_samples = generate_samples(segment_mask, 10_000, p=p, seed=0)
+
+    assert abs(np.mean(large_samples) - p) < 0.01
+
+
+def test_that_first_sample_is_the_original_image():
+    assert np.all(generate_samples(segment_mask, 10, p=0.0)[0] == 1)
+
+    images = generate_images(image, segment_mask, samples, background=0)
+    assert np.array_equal(images[0], image)
+
+
 def test_that_create_segments_only_accepts_known_methods():
     with pytest.raises(ValueError):
         _ = create_segments(
@@ -37,6 +73,71 @@ def test_image_segmentation(segmentation_method):
     assert np.min(segment_mask) == 0
 
 
+def test_that_fast_slic_rejects_images_that_are_not_uint8():
+    with pytest.raises(ValueError):
+        _ = _fast_slic(image=image / 255)
+
+
+def test_that_segmentation_is_reused_for_the_same_image(mocker):
+    segmentation_fn = mocker.Mock(return_value=segment_mask + 1)
+    mocker.patch.dict(SEGMENTATION_METHODS, {"mock": (segmentation_fn, {"a": 1})})
+    clear_segmentation_cache()
+
+    first_mask = create_segments(image=image, segmentation_method="mock")
+    first_mask[0, 0] = -1
+    second_mask = create_segments(image=image, segmentation_method="mock")
+
+    assert segmentation_fn.call_count == 1
+    assert np.array_equal(second_mask, segment_mask)
+
+    _ = create_segments(
+        image=image, segmentation_method="mock", segmentation_settings={"a": 2}
+    )
+    _ = create_segments(image=image + 1, segmentation_method="mock")
+
+    assert segmentation_fn.call_count == 3
+
+
+def test_that_segmentation_with_unhashable_settings_is_not_cached(mocker):
+    segmentation_fn = mocker.Mock(return_value=segment_mask)
+    mocker.patch.dict(SEGMENTATION_METHODS, {"mock": (segmentation_fn, {})})
+    clear_segmentation_cache()
+
+    for _ in range(2):
+        _ = create_segments(
+            image=image,
+            segmentation_method="mock",
+            segmentation_settings={"markers": np.zeros((3, 3))},
+        )
+
+    assert segmentation_fn.call_count == 2
+
+
+def test_that_segment_index_is_reused_for_the_same_mask():
+    assert SegmentIndex.from_mask(segment_mask) is SegmentIndex.from_mask(
+        segment_mask.copy()
+    )
+    assert SegmentIndex.from_mask(segment_mask) is not SegmentIndex.from_mask(
+        segment_mask.T
+    )
+
+
+def test_that_segment_index_finds_all_pixels_of_a_segment():
+    segment_index = SegmentIndex(segment_mask)
+
+    assert segment_index.num_of_segments == MAX_SEGMENT_INDEX + 1
+    assert segment_index.areas.sum() == segment_mask.size
+
+    for segment in [0, 5, MAX_SEGMENT_INDEX]:
+        pixels = segment_index.pixels_in([segment])
+        assert pixels.shape[0] == segment_index.areas[segment]
+        assert np.array_equal(
+            np.sort(pixels), np.flatnonzero(segment_mask.ravel() == segment)
+        )
+
+    assert segment_index.pixels_in([]).shape == (0,)
+
+
 def test_that_replacing_background_with_image_generates_original_image():
     images = generate_images(image, segment_mask, samples, background=image)
 
@@ -44,6 +145,51 @@ def test_that_replacing_background_with_image_generates_original_image():
         assert (images[img_idx, :, :, :] == image).all()
 
 
+def test_that_excluded_segments_are_replaced_with_background():
+    images = generate_images(image, segment_mask, samples, background=7)
+
+    for img_idx in range(images.shape[0]):
+        included = np.isin(segment_mask, np.nonzero(samples[img_idx]))
+        assert (images[img_idx][included] == image[included]).all()
+        assert (images[img_idx][~included] == 7).all()
+
+
+@pytest.mark.parametrize(
+    "batch_size,num_prefetch", list(itertools.product([1, 7, 100, 1000], [0, 1, 3]))
+)
+def test_that_image_batches_match_generated_images(batch_size, num_prefetch):
+    images = generate_images(image, segment_mask, samples)
+
+    batches = list(
+        _generate_image_batches(
+            image,
+            segment_mask,
+            samples,
+            batch_size=batch_size,
+            num_prefetch=num_prefetch,
+        )
+    )
+
+    assert all(batch.shape[0] <= batch_size for batch in batches)
+    assert np.array_equal(np.concatenate(batches), images)
+
+
+@pytest.mark.parametrize("batch_size", [None, 1, 7, 32, 100, 1000])
+def test_that_images_are_predicted_in_batches(batch_size):
+    images = generate_images(image, segment_mask, samples)
+    batch_shapes = []
+
+    def predict_fn(batch):
+        batch_shapes.append(batch.shape[0])
+        return batch.sum(axis=(1, 2))
+
+    predictions = predict_images(images, predict_fn, batch_size=batch_size)
+
+    assert np.array_equal(predictions, images.sum(axis=(1, 2)))
+    assert sum(batch_shapes) == images.shape[0]
+    assert max(batch_shapes) <= (batch_size or images.shape[0])
+
+
 @pytest.mark.parametrize(
     "norm,select",
     list(
@@ -90,6 +236,20 @@ def test_that_weigh_segments_only_accepts_known_models():
         )
 
 
+def test_that_weigh_segments_recovers_segment_weights_by_default():
+    true_weights = np.linspace(-1.0, 1.0, samples.shape[1])
+    predictions = (samples @ true_weights)[:, None]
+
+    segment_weights = weigh_segments(
+        samples=samples,
+        predictions=predictions,
+        label_idx=0,
+        distances=np.zeros(samples.shape[0]),
+    )
+
+    assert np.allclose(segment_weights, true_weights, atol=0.2)
+
+
 def test_that_subset_indices_cannot_be_below_zero():
     with pytest.raises(ValueError):
         _ = weigh_segments(
@@ -125,6 +285,20 @@ def test_that_distances_and_segment_subset_are_generated_if_not_given():
     )
 
 
+def test_that_segments_are_weighed_with_default_distances_for_many_segments():
+    many_segments_mask = np.arange(100).reshape(10, 10)
+    many_samples = generate_samples(many_segments_mask, 64, p=0.5, seed=0)
+
+    segment_weights = weigh_segments(
+        samples=many_samples,
+        predictions=np.random.default_rng(0).random((64, 5)),
+        label_idx=0,
+    )
+
+    assert segment_weights.shape == (100,)
+    assert np.all(np.isfinite(segment_weights))
+
+
 def test_that_segments_not_in_segment_subset_get_zero_weight():
     segment_subset = [1, 2, 5, 6]
     segment_weights = weigh_segments(
@@ -141,3 +315,17 @@ def test_that_segments_not_in_segment_subset_get_zero_weight():
             if idx not in segment_subset
         ]
     )
+
+
+def test_that_weights_are_assigned_to_the_segments_in_segment_subset():
+    segment_weights = weigh_segments(
+        samples=samples,
+        predictions=samples[:, [5]].astype(float),
+        label_idx=0,
+        distances=np.zeros(samples.shape[0]),
+        segment_subset=[7, 5, 1],
+    )
+
+    assert segment_weights[5] > 0.5
+    assert abs(segment_weights[7]) < 0.1
+    assert abs(segment_weights[1]) < 0.1
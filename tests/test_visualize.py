@@ -1,7 +1,10 @@
 import numpy as np
 import pytest
+from PIL import Image
 
+from visualime.lime import SegmentIndex
 from visualime.visualize import (
+    _alpha_composite,
     _get_color,
     generate_overlay,
     mark_boundaries,
@@ -271,6 +274,35 @@ def test_that_opacity_is_scaled_to_maximum():
     assert np.all(scaled_overlay[2:5, 2:5, 3] == 127)
 
 
+def test_that_opacity_is_scaled_per_segment():
+    segment_mask = np.zeros((10, 10), dtype=int)
+    segment_mask[0:2, :] = 1
+    segment_mask[5:7, :] = 2
+    segment_mask[8:10, :] = 3
+    segments_to_color = [1, 2]
+    segment_weights = np.array([0.0, 4.0, -2.0, 4.0])
+
+    overlay = generate_overlay(
+        segment_mask=segment_mask,
+        segments_to_color=segments_to_color,
+        color="red",
+        opacity=1.0,
+    )
+
+    scaled_overlay = scale_opacity(
+        overlay=overlay,
+        segment_mask=segment_mask,
+        segment_weights=segment_weights,
+        segments_to_color=segments_to_color,
+    )
+
+    assert np.all(scaled_overlay[0:2, :, 3] == 255)
+    assert np.all(scaled_overlay[5:7, :, 3] == 127)
+    # segments that are not colored keep their original opacity
+    assert np.all(scaled_overlay[2:5, :, 3] == 0)
+    assert np.all(scaled_overlay[8:10, :, 3] == 0)
+
+
 @pytest.mark.parametrize("number", [1.1, 1, np.float32(0.5), np.uint8(1)])
 def test_that_relative_to_can_be_passed_as_float_compatible(number):
     segment_mask = np.zeros((10, 10), dtype=int)
@@ -348,6 +380,27 @@ def test_that_color_can_be_obtained_by_name(color_name, rgb):
     assert np.array_equal(_get_color(color_name, 1.0), np.array(rgb + [255]))
 
 
+def test_that_overlay_is_uint8():
+    segment_mask = np.zeros((10, 10), dtype=int)
+    segment_mask[2:5, 2:5] = 1
+
+    assert _get_color("red", 0.5).dtype == np.uint8
+    assert (
+        generate_overlay(
+            segment_mask=segment_mask, segments_to_color=[1], color="red", opacity=0.5
+        ).dtype
+        == np.uint8
+    )
+
+
+def test_that_cached_colors_are_not_shared():
+    color = _get_color([10, 20, 30], 1.0)
+    color[0] = 99
+
+    assert np.array_equal(_get_color([10, 20, 30], 1.0), [10, 20, 30, 255])
+    assert np.array_equal(_get_color((10, 20, 30), 0.0), [10, 20, 30, 0])
+
+
 def test_that_invalid_color_names_raise_exception():
     with pytest.raises(ValueError):
         _get_color("this-color-does-not-exist-and-never-will", 0.5)
@@ -390,3 +443,101 @@ def test_that_mark_boundaries_highlights_boundaries():
     assert np.all(marked[2:5, 5, 0] == 255)
     assert np.all(marked[2, 2:5, 0] == 255)
     assert np.all(marked[5, 2:5, 0] == 255)
+
+
+def test_that_mark_boundaries_blends_each_boundary_pixel_once():
+    image = np.zeros((10, 10, 3))
+    segment_mask = np.zeros((10, 10), dtype=int)
+    segment_mask[2:5, 2:5] = 1
+
+    marked = mark_boundaries(
+        image=image, segment_mask=segment_mask, color="red", opacity=0.5
+    )
+
+    # the corner differs from both the pixel above and the pixel to the left
+    assert marked[2, 2, 0] == 127.5
+    assert marked[2, 3, 0] == 127.5
+    assert np.all(marked[2, 2, 1:] == 0)
+
+
+def test_that_mark_boundaries_marks_first_row_and_column():
+    image = np.zeros((10, 10, 3))
+    segment_mask = np.zeros((10, 10), dtype=int)
+    segment_mask[:, 5:] = 1
+    segment_mask[5:, :] = 2
+
+    marked = mark_boundaries(image=image, segment_mask=segment_mask)
+
+    assert marked[0, 5, 0] == 255
+    assert marked[5, 0, 0] == 255
+    assert marked[0, 0, 0] == 0
+
+
+@pytest.mark.parametrize("opacity", [1.0, 0.3])
+def test_that_mark_boundaries_matches_pixelwise_definition(opacity):
+    rng = np.random.default_rng(42)
+    image = rng.integers(0, 256, size=(32, 48, 3)).astype(float)
+    segment_mask = rng.integers(0, 4, size=(32, 48))
+    rgb_color = np.array([0, 0, 255])
+
+    expected = image.copy()
+    for i in range(image.shape[0]):
+        for j in range(image.shape[1]):
+            if (i > 0 and segment_mask[i, j] != segment_mask[i - 1, j]) or (
+                j > 0 and segment_mask[i, j] != segment_mask[i, j - 1]
+            ):
+                expected[i, j] = image[i, j] * (1 - opacity) + rgb_color * opacity
+
+    marked = mark_boundaries(
+        image=image.copy(), segment_mask=segment_mask, color="blue", opacity=opacity
+    )
+
+    assert np.allclose(marked, expected)
+
+
+def test_that_segment_index_does_not_change_results():
+    rng = np.random.default_rng(7)
+    segment_mask = rng.integers(0, 12, size=(40, 30))
+    segment_weights = rng.normal(size=12)
+    segment_index = SegmentIndex(segment_mask)
+
+    selected = select_segments(segment_weights, segment_mask, coverage=0.3)
+    selected_with_index = select_segments(
+        segment_weights, segment_mask, coverage=0.3, segment_index=segment_index
+    )
+    assert np.array_equal(selected, selected_with_index)
+
+    overlay = generate_overlay(segment_mask, selected, color="green", opacity=0.7)
+    overlay_with_index = generate_overlay(
+        segment_mask,
+        selected,
+        color="green",
+        opacity=0.7,
+        segment_index=segment_index,
+    )
+    assert np.array_equal(overlay, overlay_with_index)
+
+    scaled_overlay = scale_opacity(
+        overlay, segment_mask, segment_weights, segments_to_color=selected
+    )
+    scaled_overlay_with_index = scale_opacity(
+        overlay,
+        segment_mask,
+        segment_weights,
+        segments_to_color=selected,
+        segment_index=segment_index,
+    )
+    assert np.array_equal(scaled_overlay, scaled_overlay_with_index)
+
+
+def test_that_alpha_composite_matches_pil():
+    rng = np.random.default_rng(3)
+    image = rng.integers(0, 256, size=(32, 32, 3)).astype(np.uint8)
+    overlay = rng.integers(0, 256, size=(32, 32, 4)).astype(np.uint8)
+
+    expected = Image.fromarray(image, "RGB").convert("RGBA")
+    expected.alpha_composite(Image.fromarray(overlay, "RGBA"))
+
+    assert np.array_equal(
+        _alpha_composite(image, overlay), np.array(expected)[:, :, :3]
+    )
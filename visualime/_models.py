@@ -1,3 +1,4 @@
+from functools import partial
 from typing import Any, Dict, Literal, Optional
 
 from sklearn.linear_model import BayesianRidge, Lasso, LinearRegression, Ridge
@@ -16,7 +17,9 @@ LINEAR_MODEL_TYPES = Literal[
 LINEAR_MODELS: Dict[LINEAR_MODEL_TYPES, Any] = {
     "linear_regression": LinearRegression,
     "lasso": Lasso,
-    "ridge": Ridge,
+    # LIME's samples have few features, so solving the normal equations via
+    # Cholesky decomposition is the fastest way to fit the model
+    "ridge": partial(Ridge, solver="cholesky"),
     "bayesian_ridge": BayesianRidge,
     "bayesian_ridge_fixed_lambda": BayesianRidgeFixedLambda,
     "bayesian_ridge_fixed_alpha_lambda": BayesianRidgeFixedAlphaLambda,
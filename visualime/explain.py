@@ -1,4 +1,18 @@
-from typing import Any, Callable, Dict, Optional, Tuple, Union
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
 
 import numpy as np
 from PIL import Image
@@ -8,6 +22,8 @@ from ._models import LINEAR_MODEL_TYPES
 from .feature_selection import forward_selection, select_by_weight
 from .lime import SEGMENTATION_METHOD_TYPES  # noqa
 from .lime import (
+    SegmentIndex,
+    _generate_image_batches,
     compute_distances,
     create_segments,
     generate_images,
@@ -16,7 +32,12 @@ from .lime import (
     predict_images,
     weigh_segments,
 )
-from .visualize import generate_overlay, scale_opacity, select_segments
+from .visualize import (
+    _alpha_composite,
+    generate_overlay,
+    scale_opacity,
+    select_segments,
+)
 
 
 def explain_classification(
@@ -30,7 +51,8 @@ def explain_classification(
     p: float = 0.33,
     segment_selection_method: str = "by_weight",
     num_segments_to_select: Optional[int] = 0,
-    
+    batch_size: int = 32,
+    num_prefetch: int = 2,
 ) -> Tuple[np.ndarray, np.ndarray]:
     """Explain why the classifier called through `predict_fn` classifies the `image` into
     a particular class using the LIME algorithm.
@@ -75,6 +97,15 @@ def explain_classification(
         The number of segments to be considered when fitting the linear model to determine the `segment_weights`.
         If not given, half of the generated segments are selected.
 
+    batch_size : int, default 32
+        The number of sample images generated and passed to `predict_fn()` at once.
+        Only `batch_size * (num_prefetch + 1)` images are held in memory at any time.
+
+    num_prefetch : int, default 2
+        The number of batches of sample images generated in the background while
+        `predict_fn()` processes the current batch.
+        If set to `0`, images are only generated once they are needed.
+
     X_train: np.ndarray
         The training data, to extract the most similiar training image from. shape: (num_of_trainingimages, image_width, image_height, 3)
     Returns
@@ -109,12 +140,45 @@ def explain_classification(
     )
     print(samples.shape)
     print(samples)
-    images = generate_images(image=image, segment_mask=segment_mask, samples=samples)
+    batch_predictions: List[np.ndarray] = []
+    batch_distances: List[np.ndarray] = []
+    for images in _generate_image_batches(
+        image=image,
+        segment_mask=segment_mask,
+        samples=samples,
+        batch_size=batch_size,
+        num_prefetch=num_prefetch,
+    ):
+        batch_predictions.append(
+            predict_images(images=images, predict_fn=predict_fn, batch_size=None)
+        )
+        batch_distances.append(compute_distances(image=image, images=images))
 
-    predictions = predict_images(images=images, predict_fn=predict_fn)
+    predictions = np.concatenate(batch_predictions)
+    distances = np.concatenate(batch_distances)
+
+    segment_weights = _select_and_weigh_segments(
+        samples=samples,
+        predictions=predictions,
+        distances=distances,
+        label_idx=label_idx,
+        model_type=model_type,
+        segment_selection_method=segment_selection_method,
+        num_segments_to_select=num_segments_to_select,
+    )
+
+    return segment_mask, segment_weights
 
-    distances = compute_distances(image=image, images=images)
 
+def _select_and_weigh_segments(
+    samples: np.ndarray,
+    predictions: np.ndarray,
+    distances: np.ndarray,
+    label_idx: int,
+    model_type: LINEAR_MODEL_TYPES,
+    segment_selection_method: str,
+    num_segments_to_select: Optional[int],
+) -> np.ndarray:
     num_segments_to_select = num_segments_to_select or int(samples.shape[1] / 2)
 
     if segment_selection_method == "by_weight":
@@ -138,7 +202,7 @@ def explain_classification(
             "Segment selection method has to be either 'by_weight' or 'forward_selection'."
         )
 
-    segment_weights = weigh_segments(
+    return weigh_segments(
         samples=samples,
         predictions=predictions,
         label_idx=label_idx,
@@ -147,7 +211,201 @@ def explain_classification(
         segment_subset=segment_subset,
     )
 
-    return segment_mask, segment_weights
+
+def _segment_and_sample(
+    image: np.ndarray,
+    segmentation_method: SEGMENTATION_METHOD_TYPES,
+    segmentation_settings: Optional[Dict[str, Any]],
+    num_of_samples: int,
+    p: float,
+    seed: np.random.SeedSequence,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    segment_mask = create_segments(
+        image=image,
+        segmentation_method=segmentation_method,
+        segmentation_settings=segmentation_settings,
+    )
+    samples = generate_samples(
+        segment_mask=segment_mask, num_of_samples=num_of_samples, p=p, seed=seed
+    )
+    images = generate_images(image=image, segment_mask=segment_mask, samples=samples)
+    distances = compute_distances(image=image, images=images)
+
+    return segment_mask, samples, images, distances
+
+
+def _chain_batches(
+    arrays: Iterable[np.ndarray], batch_size: int
+) -> Iterator[np.ndarray]:
+    """Yield batches of `batch_size` rows drawn consecutively from `arrays`.
+
+    Batches may span several arrays. Only such batches are copied; all others are views.
+    """
+    pending: List[np.ndarray] = []
+    num_pending = 0
+    for array in arrays:
+        start = 0
+        while start < array.shape[0]:
+            stop = min(start + batch_size - num_pending, array.shape[0])
+            pending.append(array[start:stop])
+            num_pending += stop - start
+            start = stop
+            if num_pending == batch_size:
+                yield pending[0] if len(pending) == 1 else np.concatenate(pending)
+                pending, num_pending = [], 0
+    if pending:
+        yield pending[0] if len(pending) == 1 else np.concatenate(pending)
+
+
+def explain_classifications(
+    images: Sequence[np.ndarray],
+    predict_fn: Callable[[np.ndarray], np.ndarray],
+    label_idx: Optional[List[int]] = None,
+    segmentation_method: SEGMENTATION_METHOD_TYPES = "slic",
+    segmentation_settings: Optional[Dict[str, Any]] = None,
+    num_of_samples: int = 64,
+    p: float = 0.33,
+    segment_selection_method: str = "by_weight",
+    num_segments_to_select: Optional[int] = 0,
+    batch_size: int = 32,
+    max_workers: Optional[int] = None,
+    seed: Optional[int] = None,
+) -> List[Tuple[np.ndarray, np.ndarray]]:
+    """Explain the classification of several images at once using the LIME algorithm.
+
+    Segmenting each image and generating its sample images is independent of the other
+    images and runs in parallel in separate processes. The sample images of all images
+    are then passed to `predict_fn()` from the calling process, in batches that may
+    span several images.
+
+    The sample images of each image, an array of shape
+    `(num_of_samples, image_width, image_height, 3)`, are sent back from the worker
+    process and kept until they have been predicted. They are never concatenated
+    across images, but if `predict_fn()` is slower than the workers, up to
+    `len(images) * num_of_samples` sample images may be held in memory at once.
+
+    Parameters
+    ----------
+    images : sequence of np.ndarray
+        The images to explain, each as a three-dimensional array of shape
+        `(image_width, image_height, 3)` representing an RGB image.
+        All images must have the same shape.
+
+    predict_fn : Callable
+        A function that takes an input of shape `(num_of_samples, image_width, image_height, 3)`
+        and returns an array of shape `(num_of_samples, num_of_classes)`.
+
+    label_idx : list of ints, optional
+        For each image, the index of the label to explain in the output of `predict_fn()`.
+        Must contain one index per image.
+        If not given, this corresponds to the class that `predict_fn()` assigns
+        to each image.
+
+    segmentation_method : str, default "slic"
+        The method used to segment the images into superpixels.
+        See :meth:`visualime.lime.create_segments` for available methods.
+
+    segmentation_settings : dict, optional
+        Keyword arguments to pass to the segmentation method.
+        See :meth:`visualime.lime.create_segments` for details.
+
+    num_of_samples : int, default 64
+        The number of sample images to generate per image.
+
+    p : float, default 0.33
+        The probability of a segment to be kept in a sample.
+
+    segment_selection_method : str, default "by_weight"
+        The segment selection method.
+        Possible choices are "by_weight" and "forward_selection".
+
+    num_segments_to_select : int, optional
+        The number of segments to be considered when fitting the linear model to determine the `segment_weights`.
+        If not given, half of the generated segments are selected.
+
+    batch_size : int, default 32
+        The maximum number of sample images passed to `predict_fn()` at once.
+
+    max_workers : int, optional
+        The number of processes used to segment the images and generate the samples.
+        If not given, one process per CPU is used, but no more than there are images.
+
+    seed : int, optional
+        Seed for the random generation of samples.
+        Set it to obtain reproducible explanations.
+
+    Returns
+    -------
+    list of tuples
+        For each image, a tuple `(segment_mask, segment_weights)` as returned
+        by :meth:`visualime.explain.explain_classification`.
+        An empty list if no images are given.
+    """
+    model_type: LINEAR_MODEL_TYPES = "bayesian_ridge"
+
+    if label_idx is not None and len(label_idx) != len(images):
+        raise ValueError(
+            f"Got {len(label_idx)} label indices for {len(images)} images. "
+            "Pass one label index per image."
+        )
+
+    if len(images) == 0:
+        return []
+
+    if max_workers is None:
+        max_workers = min(os.cpu_count() or 1, len(images))
+
+    segments_and_samples: List[Tuple[np.ndarray, np.ndarray, np.ndarray]] = []
+
+    def _sample_images(
+        results: Iterable[Tuple[np.ndarray, ...]]
+    ) -> Iterator[np.ndarray]:
+        # Keep everything but the sample images, which are only needed for prediction
+        for segment_mask, samples, sample_images, distances in results:
+            segments_and_samples.append((segment_mask, samples, distances))
+            yield sample_images
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        results = executor.map(
+            _segment_and_sample,
+            images,
+            repeat(segmentation_method),
+            repeat(segmentation_settings),
+            repeat(num_of_samples),
+            repeat(p),
+            np.random.SeedSequence(seed).spawn(len(images)),
+        )
+        predictions = np.concatenate(
+            [
+                predict_fn(batch)
+                for batch in _chain_batches(_sample_images(results), batch_size)
+            ]
+        )
+
+    if label_idx is None:
+        # The first sample of each image is the unmodified image
+        label_idx = [
+            int(label) for label in np.argmax(predictions[::num_of_samples], axis=1)
+        ]
+
+    explanations = []
+    for image_idx, (segment_mask, samples, distances) in enumerate(
+        segments_and_samples
+    ):
+        segment_weights = _select_and_weigh_segments(
+            samples=samples,
+            predictions=predictions[
+                image_idx * num_of_samples : (image_idx + 1) * num_of_samples
+            ],
+            distances=distances,
+            label_idx=label_idx[image_idx],
+            model_type=model_type,
+            segment_selection_method=segment_selection_method,
+            num_segments_to_select=num_segments_to_select,
+        )
+        explanations.append((segment_mask, segment_weights))
+
+    return explanations
 
 
 def render_explanation(
@@ -162,7 +420,8 @@ def render_explanation(
     num_of_segments: Optional[int] = None,
     min_num_of_segments: int = 0,
     max_num_of_segments: Optional[int] = None,
-) -> PIL_Image:
+    return_array: bool = False,
+) -> Union[PIL_Image, np.ndarray]:
     """Render a visual explanation from the `segment_mask` and `segment_weights`
     produced by :meth:`visualime.explain.explain_classification`.
 
@@ -211,10 +470,16 @@ def render_explanation(
     max_num_of_segments : int, optional
         The maximum number of segments to be colored.
 
+    return_array : bool, default False
+        If `True`, return the rendered explanation as an array instead of a PIL Image.
+
     Returns
     -------
-    PIL.Image
-        The rendered explanation as a PIL Image object.
+    PIL.Image or np.ndarray
+        The rendered explanation as a PIL Image object in RGBA mode.
+
+        If `return_array` is set, the rendered explanation as an array of shape
+        `(image_width, image_height, 3)` and dtype `uint8` representing an RGB image.
 
     Examples
     --------
@@ -236,7 +501,9 @@ def render_explanation(
         if max_num_of_segments is not None:
             max_num_of_segments = max(max_num_of_segments // 2, 1)
 
-    final_img = Image.fromarray(image.astype(np.uint8), "RGB").convert("RGBA")
+    final_img = image.astype(np.uint8)
+
+    segment_index = SegmentIndex.from_mask(segment_mask)
 
     if positive is not None:
         positive_segments = select_segments(
@@ -246,10 +513,15 @@ def render_explanation(
             num_of_segments=num_of_segments,
             min_num_of_segments=min_num_of_segments,
             max_num_of_segments=max_num_of_segments,
+            segment_index=segment_index,
         )
 
         positive_overlay = generate_overlay(
-            segment_mask, positive_segments, color=positive, opacity=opacity
+            segment_mask,
+            positive_segments,
+            color=positive,
+            opacity=opacity,
+            segment_index=segment_index,
         )
 
         positive_overlay = scale_opacity(
@@ -258,10 +530,10 @@ def render_explanation(
             segment_mask=segment_mask,
             segments_to_color=positive_segments,
             max_opacity=opacity,
+            segment_index=segment_index,
         )
 
-        overlay_image = Image.fromarray(positive_overlay.astype(np.uint8), "RGBA")
-        final_img.alpha_composite(overlay_image)
+        final_img = _alpha_composite(final_img, positive_overlay)
 
     if negative is not None:
         negative_segments = select_segments(
@@ -271,9 +543,14 @@ def render_explanation(
             num_of_segments=num_of_segments,
             min_num_of_segments=min_num_of_segments,
             max_num_of_segments=max_num_of_segments,
+            segment_index=segment_index,
         )
         negative_overlay = generate_overlay(
-            segment_mask, negative_segments, color=negative, opacity=opacity
+            segment_mask,
+            negative_segments,
+            color=negative,
+            opacity=opacity,
+            segment_index=segment_index,
         )
 
         negative_overlay = scale_opacity(
@@ -282,9 +559,12 @@ def render_explanation(
             segment_mask=segment_mask,
             segments_to_color=negative_segments,
             max_opacity=opacity,
+            segment_index=segment_index,
         )
 
-        overlay_image = Image.fromarray(negative_overlay.astype(np.uint8), "RGBA")
-        final_img.alpha_composite(overlay_image)
+        final_img = _alpha_composite(final_img, negative_overlay)
+
+    if return_array:
+        return final_img
 
-    return final_img
+    return Image.fromarray(final_img, "RGB").convert("RGBA")
@@ -169,8 +169,13 @@ def lars_selection(
         samples, num_segments_to_select
     )
 
+    # lars_path() updates arrays derived from the samples in place,
+    # which overflows or truncates for the integer samples
     _, _, coefs, num_of_iterations = lars_path(
-        samples, predictions[:, label_idx], return_path=True, return_n_iter=True
+        samples.astype(np.float64),
+        predictions[:, label_idx],
+        return_path=True,
+        return_n_iter=True,
     )
 
     for iteration in range(num_of_iterations, 0, -1):
@@ -1,11 +1,43 @@
-from typing import Any, Callable, Dict, List, Literal, Optional, Tuple, Union
+import hashlib
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import (
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    Hashable,
+    Iterator,
+    List,
+    Literal,
+    Optional,
+    Tuple,
+    Union,
+)
 
 import numpy as np
 from skimage.color import rgb2gray
 from skimage.filters import sobel
 from skimage.segmentation import felzenszwalb, quickshift, slic, watershed
 
+try:
+    import cupy as cp
+    from cucim.skimage.segmentation import slic as cucim_slic
+except ImportError:  # pragma: no cover
+    cp = None
+    cucim_slic = None
+
+try:
+    from fast_slic.avx2 import SlicAvx2 as FastSlic
+except ImportError:  # pragma: no cover
+    try:
+        from fast_slic import Slic as FastSlic
+    except ImportError:
+        FastSlic = None
+
 __all__ = [
+    "SegmentIndex",
+    "clear_segmentation_cache",
     "create_segments",
     "generate_images",
     "generate_samples",
@@ -35,6 +67,47 @@ SAMPLES_PREDICTIONS_LABEL_IDX_DOC = """samples : np.ndarray
         Can be the class predicted by the model, or a different class."""
 
 
+class _LRUCache:
+    """Minimal least-recently-used cache with a bounded number of entries."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Any:
+        try:
+            self._entries.move_to_end(key)
+        except KeyError:
+            return None
+        return self._entries[key]
+
+    def put(self, key: Hashable, value: Any) -> None:
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+def _array_digest(array: np.ndarray) -> Tuple[Tuple[int, ...], str, str]:
+    """Identify an array by its shape, dtype, and a hash of its contents."""
+    digest = hashlib.blake2b(np.ascontiguousarray(array).data, digest_size=16)
+    return array.shape, array.dtype.str, digest.hexdigest()
+
+
+_SEGMENT_MASK_CACHE = _LRUCache(maxsize=16)
+_SEGMENT_INDEX_CACHE = _LRUCache(maxsize=16)
+
+
+def clear_segmentation_cache() -> None:
+    """Clear the cached results of :meth:`visualime.lime.create_segments`
+    and :meth:`visualime.lime.SegmentIndex.from_mask`."""
+    _SEGMENT_MASK_CACHE.clear()
+    _SEGMENT_INDEX_CACHE.clear()
+
+
 def _watershed(image: np.ndarray, **kwargs):
     gradient = sobel(rgb2gray(image))
     return watershed(image=gradient, **kwargs)
@@ -60,7 +133,35 @@ def pixelwise_segmentation(image: np.ndarray) -> np.ndarray:
     
     return segmented_image
 
-SEGMENTATION_METHOD_TYPES = Literal["felzenszwalb", "slic", "quickshift", "watershed", "pixelwise"]
+
+def _slic_gpu(image: np.ndarray, **kwargs):  # pragma: no cover
+    segment_mask = cucim_slic(image=cp.asarray(image), **kwargs)
+    return cp.asnumpy(segment_mask - cp.min(segment_mask))
+
+
+def _fast_slic(
+    image: np.ndarray, n_segments: int = 250, compactness: float = 10, **kwargs
+):
+    if image.dtype != np.uint8:
+        raise ValueError(
+            "The 'fast_slic' segmentation method requires an image of dtype uint8. "
+            f"Got {image.dtype} instead."
+        )
+
+    return FastSlic(
+        num_components=n_segments, compactness=compactness, **kwargs
+    ).iterate(np.ascontiguousarray(image))
+
+
+SEGMENTATION_METHOD_TYPES = Literal[
+    "felzenszwalb",
+    "slic",
+    "slic_gpu",
+    "fast_slic",
+    "quickshift",
+    "watershed",
+    "pixelwise",
+]
 
 SEGMENTATION_METHODS: Dict[
     SEGMENTATION_METHOD_TYPES, Tuple[Callable, Dict[str, Any]]
@@ -81,6 +182,18 @@ SEGMENTATION_METHODS: Dict[
     "pixelwise": (pixelwise_segmentation, {})
 }
 
+if cucim_slic is not None:  # pragma: no cover
+    SEGMENTATION_METHODS["slic_gpu"] = (
+        _slic_gpu,
+        dict(SEGMENTATION_METHODS["slic"][1]),
+    )
+
+if FastSlic is not None:  # pragma: no cover
+    SEGMENTATION_METHODS["fast_slic"] = (
+        _fast_slic,
+        {"n_segments": 250, "compactness": 10},
+    )
+
 
 def create_segments(
     image: np.ndarray,
@@ -111,6 +224,13 @@ def create_segments(
         <https://scikit-image.org/docs/stable/api/skimage.segmentation.html>`_
         for details.
 
+        If `cuCIM <https://github.com/rapidsai/cucim>`_ is installed, `"slic_gpu"`
+        runs SLIC on the GPU, taking the same settings as `"slic"`.
+
+        If `fast-slic <https://github.com/Algy/fast-slic>`_ is installed, `"fast_slic"`
+        provides a considerably faster SLIC implementation for the CPU.
+        It is the recommended choice for SLIC segmentation when no GPU is available.
+
     segmentation_settings : dict, optional
         Keyword arguments to pass to the segmentation method.
 
@@ -126,6 +246,13 @@ def create_segments(
 
         Segment numbers start at 0 and are continuous. The number of segments can be computed
         by determining the maximum value in the array and adding 1.
+
+    Notes
+    -----
+    The most recently computed segment masks are cached, keyed by the content of the
+    `image`, the `segmentation_method`, and the settings. Repeatedly explaining the same
+    image therefore only segments it once. Call :meth:`visualime.lime.clear_segmentation_cache`
+    to free the memory held by the cache.
     """
     segmentation_settings = segmentation_settings or {}
 
@@ -139,13 +266,109 @@ def create_segments(
 
     settings = {**default_settings, **segmentation_settings}
 
-    _segment_mask = segmentation_fn(image=image, **settings)
+    cache_key: Optional[Hashable] = (
+        _array_digest(image),
+        segmentation_method,
+        tuple(sorted(settings.items())),
+    )
+    try:
+        hash(cache_key)
+    except TypeError:
+        # Settings such as an array of markers cannot be used as part of the key
+        cache_key = None
+
+    if cache_key is not None:
+        cached_segment_mask = _SEGMENT_MASK_CACHE.get(cache_key)
+        if cached_segment_mask is not None:
+            return cached_segment_mask.copy()
+
+    segment_mask = segmentation_fn(image=image, **settings)
+    # Most methods already start numbering at 0, in which case no copy is required
+    min_segment_idx = np.min(segment_mask)
+    if min_segment_idx != 0:
+        segment_mask = segment_mask - min_segment_idx
+
+    if cache_key is not None:
+        _SEGMENT_MASK_CACHE.put(cache_key, segment_mask.copy())
+
+    return segment_mask
+
+
+class SegmentIndex:
+    """Index of the pixels that belong to each segment of a segment mask.
+
+    Building the index requires sorting the pixels by segment once. Afterwards,
+    the pixels of any set of segments can be looked up without scanning the
+    whole `segment_mask` again, so it pays off when the same mask is processed
+    repeatedly, e.g., by :meth:`visualime.explain.render_explanation`.
+
+    Parameters
+    ----------
+    segment_mask : np.ndarray
+        The mask generated by :meth:`visualime.lime.create_segments`:
+        An array of shape `(image_width, image_height)`.
 
-    return _segment_mask - np.min(_segment_mask)
+    Attributes
+    ----------
+    shape : tuple of ints
+        The shape of the `segment_mask`.
+
+    areas : np.ndarray
+        The number of pixels in each segment: An array of length `num_of_segments`.
+
+    pixel_index : np.ndarray
+        The flat indices of all pixels, grouped by segment.
+
+    offsets : np.ndarray
+        The pixels of segment `i` are `pixel_index[offsets[i]:offsets[i + 1]]`:
+        An array of length `num_of_segments + 1`.
+    """
+
+    def __init__(self, segment_mask: np.ndarray):
+        flat_mask = segment_mask.ravel()
+
+        self.shape: Tuple[int, ...] = segment_mask.shape
+        self.areas: np.ndarray = np.bincount(flat_mask)
+        self.offsets: np.ndarray = np.concatenate(([0], np.cumsum(self.areas)))
+        self.pixel_index: np.ndarray = np.argsort(flat_mask, kind="stable")
+
+    @classmethod
+    def from_mask(cls, segment_mask: np.ndarray) -> "SegmentIndex":
+        """Return the index for `segment_mask`, reusing a cached index if the same
+        mask has been indexed recently.
+
+        The returned index may be shared and must not be modified.
+        """
+        cache_key = _array_digest(segment_mask)
+        segment_index = _SEGMENT_INDEX_CACHE.get(cache_key)
+        if segment_index is None:
+            segment_index = cls(segment_mask)
+            _SEGMENT_INDEX_CACHE.put(cache_key, segment_index)
+        return segment_index
+
+    @property
+    def num_of_segments(self) -> int:
+        return self.areas.shape[0]
+
+    def pixels_in(self, segments: Union[np.ndarray, List[int]]) -> np.ndarray:
+        """Return the flat indices of all pixels that belong to the given `segments`.
+
+        The pixels are grouped by segment in the order of `segments`.
+        """
+        return np.concatenate(
+            [np.zeros(0, dtype=self.pixel_index.dtype)]
+            + [
+                self.pixel_index[self.offsets[segment] : self.offsets[segment + 1]]
+                for segment in segments
+            ]
+        )
 
 
 def generate_samples(
-    segment_mask: np.ndarray, num_of_samples: int = 64, p: float = 0.5
+    segment_mask: np.ndarray,
+    num_of_samples: int = 64,
+    p: float = 0.5,
+    seed: Optional[Union[int, np.random.SeedSequence, np.random.Generator]] = None,
 ) -> np.ndarray:
     """Generate samples by randomly selecting a subset of the segments.
 
@@ -159,16 +382,34 @@ def generate_samples(
         The number of samples to generate.
 
     p : float
-        The probability for each segment to be removed from a sample.
+        The probability for each segment to be kept in a sample.
+
+    seed : {int, np.random.SeedSequence, np.random.Generator}, optional
+        Seed for the random number generator, passed to :meth:`numpy.random.default_rng`.
+        Set it to generate reproducible samples.
 
     Returns
     -------
     np.ndarray
-        A two-dimensional array of shape `(num_of_samples, num_of_segments)`.
+        A two-dimensional array of shape `(num_of_samples, num_of_segments)` and
+        dtype `uint8`, where `1` means that the segment is kept in the sample.
+        Cast it to a wider type before computing sums or products over samples,
+        e.g., `samples.T @ samples`, which overflow in `uint8`.
+
+        The first sample always contains all segments, i.e., it corresponds to the
+        original image. Its prediction can therefore be used to determine the
+        class predicted for the original image.
     """
     num_of_segments = int(np.max(segment_mask) + 1)
 
-    return np.random.binomial(n=1, p=p, size=(num_of_samples, num_of_segments))
+    rng = np.random.default_rng(seed)
+
+    samples = (
+        rng.random(size=(num_of_samples, num_of_segments), dtype=np.float32) < p
+    ).astype(np.uint8)
+    samples[:1] = 1
+
+    return samples
 
 def generate_samples_ROLEX(
     segment_mask: np.ndarray, image: np.ndarray, label_idx: int, X_train, num_of_samples: int = 64,  
@@ -230,25 +471,63 @@ def generate_images(
     np.ndarray
         An array of shape `(num_of_samples, image_width, image_height, 3)`.
     """
-    binary_segment_mask = np.zeros(
-        shape=(samples.shape[0], image.shape[0], image.shape[1]), dtype=np.uint8
-    )
+    # Indexing the (small) samples array with the segment mask yields the binary mask
+    # of every sample in a single gather instead of one pass over the image per sample
+    binary_segment_mask = samples.astype(np.uint8, copy=False)[:, segment_mask]
+
+    if background is None:
+        return binary_segment_mask[:, :, :, None] * image
 
-    for sample_idx in range(binary_segment_mask.shape[0]):
-        binary_segment_mask[sample_idx, :, :] = np.isin(
-            segment_mask, np.nonzero(samples[sample_idx])
-        ).astype(np.uint8)
+    return np.where(binary_segment_mask[:, :, :, None], image, background)
 
-    images = binary_segment_mask[:, :, :, None] * image
 
-    if background is not None:
-        images += (1 - binary_segment_mask)[:, :, :, None] * background
+def _generate_image_batches(
+    image: np.ndarray,
+    segment_mask: np.ndarray,
+    samples: np.ndarray,
+    background: Optional[Union[np.ndarray, int, float]] = None,
+    batch_size: int = 32,
+    num_prefetch: int = 2,
+) -> Iterator[np.ndarray]:
+    """Yield the images for consecutive batches of `samples`.
+
+    Up to `num_prefetch` batches are generated ahead of time in a background thread,
+    so that image generation overlaps with whatever the caller does with the current
+    batch (usually running the model).
+    """
 
-    return images
+    def _generate(start: int) -> np.ndarray:
+        return generate_images(
+            image=image,
+            segment_mask=segment_mask,
+            samples=samples[start : start + batch_size],
+            background=background,
+        )
+
+    starts = iter(range(0, samples.shape[0], batch_size))
+
+    if num_prefetch < 1:
+        for start in starts:
+            yield _generate(start)
+        return
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        pending: Deque = deque(
+            executor.submit(_generate, start)
+            for _, start in zip(range(num_prefetch), starts)
+        )
+        while pending:
+            images = pending.popleft().result()
+            next_start = next(starts, None)
+            if next_start is not None:
+                pending.append(executor.submit(_generate, next_start))
+            yield images
 
 
 def predict_images(
-    images: np.ndarray, predict_fn: Callable[[np.ndarray], np.ndarray]
+    images: np.ndarray,
+    predict_fn: Callable[[np.ndarray], np.ndarray],
+    batch_size: Optional[int] = 32,
 ) -> np.ndarray:
     """Obtain model predictions for all images.
 
@@ -267,12 +546,24 @@ def predict_images(
         When building explanation pipelines, it is generally preferable to replace `predict_images()`
         entirely.
 
+    batch_size : int, optional, default 32
+        The maximum number of images passed to `predict_fn()` in a single call.
+        If `None`, all images are passed at once.
+
     Returns
     -------
     np.ndarray
         An array of shape `(num_of_samples, num_of_classes)`.
     """
-    return predict_fn(images)
+    if batch_size is None or images.shape[0] <= batch_size:
+        return predict_fn(images)
+
+    return np.concatenate(
+        [
+            predict_fn(images[start : start + batch_size])
+            for start in range(0, images.shape[0], batch_size)
+        ]
+    )
 
 
 def compute_distances(
@@ -357,20 +648,16 @@ def weigh_segments(
         reduced_samples = samples
         segment_subset = list(range(samples.shape[1]))
 
+    # scikit-learn casts the sample weights to the dtype of the samples, and the
+    # kernel weights can be far below the smallest positive float32
+    reduced_samples = reduced_samples.astype(np.float64)
+
     linear_model.fit(
         reduced_samples, predictions[:, label_idx], sample_weight=sample_weight
     )
 
-    reduced_weights = list(linear_model.coef_)
-
-    segment_weights = np.array(
-        [
-            reduced_weights[segment_subset.index(segment_idx)]
-            if segment_idx in segment_subset
-            else 0.0
-            for segment_idx in range(samples.shape[1])
-        ]
-    )
+    segment_weights = np.zeros(samples.shape[1])
+    segment_weights[segment_subset] = linear_model.coef_
 
     return segment_weights
 
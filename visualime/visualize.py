@@ -1,10 +1,13 @@
 import warnings
+from functools import lru_cache
 from typing import List, Literal, Optional, Tuple, Union
 
 import numpy as np
 from PIL.ImageColor import getrgb
 from skimage.transform import resize
 
+from .lime import SegmentIndex
+
 
 def select_segments(
     segment_weights: np.ndarray,
@@ -15,6 +18,7 @@ def select_segments(
     max_coverage: float = 1.0,
     min_num_of_segments: int = 0,
     max_num_of_segments: Optional[int] = None,
+    segment_index: Optional[SegmentIndex] = None,
 ) -> np.ndarray:
     """Select the segments to color.
 
@@ -69,6 +73,11 @@ def select_segments(
         Even if more segments would be required to reach the specified `coverage`,
         at most this maximum number of segments are returned.
 
+    segment_index : SegmentIndex, optional
+        A :class:`visualime.lime.SegmentIndex` built from the `segment_mask`.
+        Pass it when processing the same `segment_mask` repeatedly to avoid
+        scanning the whole mask on every call.
+
     Returns
     -------
     np.ndarray
@@ -90,8 +99,12 @@ def select_segments(
     if min_coverage >= max_coverage:
         raise ValueError("min_coverage has to be strictly smaller than max_coverage.")
 
-    max_segment_idx = int(np.max(segment_mask))
-    total_num_of_segments = max_segment_idx + 1
+    if segment_index is not None:
+        total_num_of_segments = segment_index.num_of_segments
+        max_segment_idx = total_num_of_segments - 1
+    else:
+        max_segment_idx = int(np.max(segment_mask))
+        total_num_of_segments = max_segment_idx + 1
 
     if segment_weights.shape[0] != total_num_of_segments:
         raise ValueError(
@@ -108,6 +121,13 @@ def select_segments(
         )
 
     _area = segment_mask.shape[0] * segment_mask.shape[1]
+    if segment_index is not None:
+        _segment_areas = segment_index.areas
+    else:
+        # Number of pixels in each segment, computed in a single pass over the mask
+        _segment_areas = np.bincount(
+            segment_mask.ravel(), minlength=total_num_of_segments
+        )
 
     ordered_segments = np.argsort(-segment_weights)
 
@@ -115,11 +135,12 @@ def select_segments(
         coverage = min(coverage, max_coverage, 1.0)
         coverage = max(coverage, min_coverage, 0.0)
 
-        for i in range(max_segment_idx):
-            _selected_segments = ordered_segments[: i + 1]
-            if np.isin(segment_mask, _selected_segments).sum() / _area >= coverage:
-                num_of_segments = i + 1
-                break
+        cumulative_coverage = (
+            np.cumsum(_segment_areas[ordered_segments])[:max_segment_idx] / _area
+        )
+        sufficient_coverage = np.flatnonzero(cumulative_coverage >= coverage)
+        if sufficient_coverage.size > 0:
+            num_of_segments = int(sufficient_coverage[0]) + 1
         else:
             warnings.warn(
                 f"Need to select all {max_num_of_segments} segments to reach desired "
@@ -134,22 +155,24 @@ def select_segments(
 
         _selected_segments = ordered_segments[:num_of_segments]
 
-        if np.isin(segment_mask, _selected_segments).sum() / _area > max_coverage:
+        if _segment_areas[_selected_segments].sum() / _area > max_coverage:
             selected_segments = select_segments(
                 segment_weights=segment_weights,
                 segment_mask=segment_mask,
                 coverage=max_coverage,
+                segment_index=segment_index,
             )
-            if np.isin(segment_mask, selected_segments).sum() / _area > max_coverage:
+            if _segment_areas[selected_segments].sum() / _area > max_coverage:
                 warnings.warn(
                     f"Despite selecting only {selected_segments.shape[0]} segments, "
                     f"coverage still exceeds the desired maximum of {max_coverage:.2f}."
                 )
-        elif np.isin(segment_mask, _selected_segments).sum() / _area < min_coverage:
+        elif _segment_areas[_selected_segments].sum() / _area < min_coverage:
             selected_segments = select_segments(
                 segment_weights=segment_weights,
                 segment_mask=segment_mask,
                 coverage=min_coverage,
+                segment_index=segment_index,
             )
         else:
             selected_segments = _selected_segments
@@ -158,12 +181,11 @@ def select_segments(
     return selected_segments
 
 
-def _get_color(color: Union[str, Tuple[int, int, int]], opacity: float) -> np.ndarray:
-    """Convert a color specified by name or RGB tuple into an RGBA color.
-
-    Note that `color` can also be an RGB(A) string in various formats.
-    """
-    rgb_color: Union[Tuple[int, int, int], Tuple[int, int, int, int]]
+@lru_cache(maxsize=32)
+def _get_rgba(
+    color: Union[str, Tuple[int, ...]], opacity: float
+) -> Tuple[int, int, int, int]:
+    rgb_color: Tuple[int, ...]
 
     if isinstance(color, str):
         try:
@@ -175,21 +197,36 @@ def _get_color(color: Union[str, Tuple[int, int, int]], opacity: float) -> np.nd
     else:
         rgb_color = color
 
-    _rgba = np.array(list(rgb_color[:3]) + [int(255 * opacity)]).astype(int)
+    red, green, blue = (int(channel) for channel in rgb_color[:3])
+    _rgba = (red, green, blue, int(255 * opacity))
 
-    if np.any(_rgba < 0) or np.any(_rgba > 255):
+    if not all(0 <= channel <= 255 for channel in _rgba):
         raise ValueError(
-            f"Channel values must be between 0 and 255. Got {tuple(_rgba)} instead."
+            f"Channel values must be between 0 and 255. Got {_rgba} instead."
         )
 
     return _rgba
 
 
+def _get_color(color: Union[str, Tuple[int, int, int]], opacity: float) -> np.ndarray:
+    """Convert a color specified by name or RGB tuple into an RGBA color.
+
+    Note that `color` can also be an RGB(A) string in various formats.
+
+    Parsed colors are cached, since the same few colors are usually used
+    for many explanations.
+    """
+    hashable_color = color if isinstance(color, str) else tuple(color)
+
+    return np.array(_get_rgba(hashable_color, opacity), dtype=np.uint8)
+
+
 def generate_overlay(
     segment_mask: np.ndarray,
     segments_to_color: Union[np.ndarray, List[int]],
     color: Union[str, Tuple[int, int, int]],
     opacity: float,
+    segment_index: Optional[SegmentIndex] = None,
 ) -> np.ndarray:
     """Generate a semi-transparent overlay with selected segments colored.
 
@@ -221,14 +258,26 @@ def generate_overlay(
         The opacity of the overlay as a number between `0.0` (fully transparent)
         and `1.0` (fully opaque).
 
+    segment_index : SegmentIndex, optional
+        A :class:`visualime.lime.SegmentIndex` built from the `segment_mask`.
+        Pass it when processing the same `segment_mask` repeatedly to avoid
+        scanning the whole mask on every call.
+
     Returns
     -------
     np.ndarray
-        An array of shape `(image_width, image_height, 4)` representing an RGBA image.
+        An array of shape `(image_width, image_height, 4)` and dtype `uint8`
+        representing an RGBA image.
     """
-    mask = np.isin(segment_mask, segments_to_color)
-    channel_mask = np.dstack((mask, mask, mask, mask))
-    return channel_mask * _get_color(color, opacity)
+    rgba_color = _get_color(color, opacity)
+    overlay = np.zeros(segment_mask.shape + (4,), dtype=np.uint8)
+
+    if segment_index is not None:
+        overlay.reshape(-1, 4)[segment_index.pixels_in(segments_to_color)] = rgba_color
+    else:
+        overlay[np.isin(segment_mask, segments_to_color)] = rgba_color
+
+    return overlay
 
 
 def scale_opacity(
@@ -239,6 +288,7 @@ def scale_opacity(
     relative_to: Union[Literal["max"], float] = "max",
     exponent: float = 1.0,
     max_opacity: float = 1.0,
+    segment_index: Optional[SegmentIndex] = None,
 ) -> np.ndarray:
     """Set the opacity of each segment according to its weight.
 
@@ -285,6 +335,11 @@ def scale_opacity(
     max_opacity : float, default 1.0
         The maximum opacity of the overlay as a number between `0.0` and `1.0`.
 
+    segment_index : SegmentIndex, optional
+        A :class:`visualime.lime.SegmentIndex` built from the `segment_mask`.
+        Pass it when processing the same `segment_mask` repeatedly to avoid
+        scanning the whole mask on every call.
+
     Returns
     -------
     np.ndarray
@@ -314,13 +369,32 @@ def scale_opacity(
 
     new_overlay = np.ndarray.copy(overlay)
 
-    for segment_id in segments_to_color:
-        mask = segment_mask == segment_id
-        new_overlay[mask, 3] = new_opacity[segment_id]
+    if segment_index is not None:
+        segments_to_color = np.asarray(segments_to_color, dtype=int)
+        new_overlay.reshape(-1, 4)[
+            segment_index.pixels_in(segments_to_color), 3
+        ] = np.repeat(
+            new_opacity[segments_to_color], segment_index.areas[segments_to_color]
+        )
+    else:
+        # Look up the opacity of each selected pixel by its segment number
+        mask = np.isin(segment_mask, segments_to_color)
+        new_overlay[mask, 3] = new_opacity[segment_mask[mask]]
 
     return new_overlay
 
 
+def _alpha_composite(image: np.ndarray, overlay: np.ndarray) -> np.ndarray:
+    """Composite the RGBA `overlay` onto the opaque RGB `image`.
+
+    Both arrays must be of dtype `uint8`. The result is identical to
+    :meth:`PIL.Image.Image.alpha_composite` with an opaque destination.
+    """
+    alpha = overlay[:, :, 3:4].astype(np.uint16)
+    blended = overlay[:, :, :3] * alpha + image * (255 - alpha)
+    return ((blended + 127) // 255).astype(np.uint8)
+
+
 def scale_overlay(overlay: np.ndarray, shape: Tuple[int, int]) -> np.ndarray:
     """Scale the overlay to a given size.
 
@@ -378,6 +452,8 @@ def mark_boundaries(
     opacity : float, default 1.0
         The opacity of the boundaries as a number between `0.0` and `1.0`.
 
+        Each boundary pixel is blended with the `color` exactly once.
+
     Returns
     -------
     np.ndarray
@@ -391,12 +467,13 @@ def mark_boundaries(
             f"the shape of the image ({image.shape[:2]})"
         )
 
-    for i in range(1, image.shape[0]):
-        for j in range(1, image.shape[1]):
-            if segment_mask[i, j] != segment_mask[i - 1, j]:
-                image[i, j] = image[i, j] * (1 - opacity) + rgb_color * opacity
-            if segment_mask[i, j] != segment_mask[i, j - 1]:
-                image[i, j] = image[i, j] * (1 - opacity) + rgb_color * opacity
+    # A pixel lies on a boundary if it belongs to a different segment
+    # than the pixel above or the pixel to its left
+    boundary = np.zeros(segment_mask.shape, dtype=bool)
+    np.not_equal(segment_mask[1:, :], segment_mask[:-1, :], out=boundary[1:, :])
+    boundary[:, 1:] |= segment_mask[:, 1:] != segment_mask[:, :-1]
+
+    image[boundary] = image[boundary] * (1 - opacity) + rgb_color * opacity
 
     return image
 